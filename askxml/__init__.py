@@ -1,3 +1,6 @@
 from .askxml import *
 from .column import *
-from .table import *
\ No newline at end of file
+from .table import *
+from .progress import *
+from .path import InvalidPathException
+from .driver.sqlite_driver import UnsynchronizedChangesException
\ No newline at end of file
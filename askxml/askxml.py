@@ -1,7 +1,11 @@
 from importlib import import_module
 from typing import List
 from .table import Table
+from .path import compile_path
+from xml.sax.saxutils import escape
 import tempfile
+import json
+import csv
 import os
 
 class AskXML:
@@ -71,17 +75,20 @@ class AskXML:
         filtered_properties = [p for p in properties if p[1] is not None and p[0] != self.join_name\
             and p[0] != self.id_name and p[0] != self.text_name]
         if len(filtered_properties) > 0:
-            return ' ' + ' '.join('{}="{}"'.format(name, val.replace('"', '&quot;')) for name, val in filtered_properties)
+            return ' ' + ' '.join('{}="{}"'.format(name, escape(str(val), {'"': '&quot;'})) for name, val in filtered_properties)
         else:
             return ''
 
-    def _synchronize_tags(self, tags_data, table_scope='', ident=''):
-        field_names = [desc[0] for desc in self._sync_cursor.description]
+    def _synchronize_tags(self, tags_data, table_scope='', ident='', field_names=None):
+        if field_names is None:
+            field_names = [desc[0] for desc in self._sync_cursor.description]
+        # without an ID, children can't be found
+        has_id = self.id_name in field_names
         for tag_data in tags_data:
             name_value_properties = list(zip(field_names, tag_data))
-            tag_id = tag_data[field_names.index(self.id_name)]
+            tag_id = tag_data[field_names.index(self.id_name)] if has_id else None
             tag_name = table_scope.split('_')[-1]
-            child_tables = [c for c in self.__child_tables if c[:c.rfind('_')] == table_scope]
+            child_tables = [c for c in self.__child_tables if c[:c.rfind('_')] == table_scope] if has_id else []
             text_value = ''
             try:
                 text_value = next(p[1] for p in name_value_properties if p[0] == self.text_name)
@@ -95,7 +102,7 @@ class AskXML:
                 tag_name=tag_name,
                 properties=self._serialize_properties(name_value_properties),
                 immediate_close=' /' if not child_tables and not text_value else '',
-                text=text_value,
+                text=escape(str(text_value)),
                 close_tag='</' + tag_name + '>' if text_value and not child_tables else ''))
 
             # synchronize this tag's children
@@ -115,6 +122,89 @@ class AskXML:
                 # close parent tag
                 self._sync_file.write('{ident}</{tag_name}>\n'.format(ident=ident, tag_name=tag_name))
 
+    def export(self, sql: str, target, format: str = 'xml', table: str = None, buffer_size: int = 1024 * 1024):
+        """
+        Runs a query and streams resulting rows to a file
+
+        :param sql: Query to run
+        :param target: Path to file to write, or file handle
+        :param format: Either 'xml', 'csv' or 'jsonl'
+        :param table: Name of the table rows come from. Required for xml format, where it's used to name tags
+            and to nest tags from child tables under exported tags
+        :param buffer_size: Size of write buffer, in bytes. Used if target is a path
+        """
+        if format not in ('xml', 'csv', 'jsonl'):
+            raise ValueError("Unsupported export format '{}'".format(format))
+        if format == 'xml' and not table:
+            raise ValueError("Exporting to xml requires a table name")
+
+        cursor = self._driver.create_cursor()
+        target_is_filename = isinstance(target, str)
+        export_file = open(target, 'w', buffering=buffer_size, encoding='utf-8', newline='')\
+            if target_is_filename else target
+        try:
+            rows = cursor.execute(sql)
+            field_names = [desc[0] for desc in cursor.description]
+            if format == 'csv':
+                writer = csv.writer(export_file)
+                writer.writerow(field_names)
+                writer.writerows(rows)
+            elif format == 'jsonl':
+                for row in rows:
+                    export_file.write(json.dumps(dict(zip(field_names, row))) + '\n')
+            else:
+                self._export_xml(rows, field_names, table, export_file)
+        finally:
+            if target_is_filename:
+                export_file.close()
+            cursor.close()
+
+    def _export_xml(self, rows, field_names, table_scope, export_file):
+        root_name, root_attrib = self._driver.get_xml_root()
+        _, self.__child_tables = self._driver.get_tables()
+        self._sync_cursor = self._driver.create_cursor()
+        self._sync_file = export_file
+        try:
+            export_file.write("<{tag}{properties}>\n".format(
+                tag=root_name,
+                properties=self._serialize_properties(root_attrib.items())))
+            self._synchronize_tags(rows, table_scope=table_scope, ident=self.serialize_ident, field_names=field_names)
+            export_file.write("</{tag}>\n".format(tag=root_name))
+        finally:
+            self._sync_cursor.close()
+
+    def select_path(self, path: str):
+        """
+        Runs an XPath-like query and returns a cursor over its results.
+        Selecting whole nodes returns table rows, selecting @attribute or text() returns one column.
+        See askxml.path for supported syntax
+
+        :param path: Path to select, eg. someParent[@name="Jerry"]/someChild/@name
+        """
+        cursor = self._driver.create_cursor()
+        try:
+            root_tables, child_tables = self._driver.get_tables()
+            tables = {}
+            for table_name in root_tables + child_tables:
+                columns = cursor.execute("PRAGMA table_info('{}')".format(table_name)).fetchall()
+                tables[table_name] = set(c[1] for c in columns)
+
+            sql, parameters = compile_path(path, tables, self._driver.get_xml_root()[0],
+                join_name=self.join_name, id_name=self.id_name, text_name=self.text_name)
+            return cursor.execute(sql, parameters)
+        except:
+            cursor.close()
+            raise
+
+    def refresh(self):
+        """
+        Loads nodes appended to source XML file since it was opened. If the file
+        was modified in any other way, it's loaded again from scratch, and cursors
+        created before stop working. If persist_data is enabled and data was changed,
+        raises an exception instead, since reloading would discard the changes.
+        """
+        self._driver.refresh(discard_changes=not self.persist_data)
+
     def close(self):
         """
         Closes connection to XML document
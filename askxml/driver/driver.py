@@ -16,6 +16,15 @@ class Driver(ABC):
         """
         pass
 
+    def refresh(self, discard_changes: bool = True):
+        """
+        Loads data appended to the source document since it was loaded.
+        Drivers that can't load data incrementally don't need to override this.
+
+        :param discard_changes: Whether changes to data can be discarded if the document has to be loaded again
+        """
+        raise NotImplementedError("{} doesn't support refreshing".format(type(self).__name__))
+
     @abstractmethod
     def create_cursor(self):
         pass
@@ -1,18 +1,147 @@
-from typing import Dict, AbstractSet, List, Tuple
+from typing import Dict, AbstractSet, List, Tuple, Callable
 from abc import abstractmethod
 from askxml import column, table
+from askxml.progress import ProgressReporter
 from .driver import Driver
 try:
     import lxml.etree as xml
 except ModuleNotFoundError:
     import xml.etree.cElementTree as xml
+try:
+    import numpy
+except ModuleNotFoundError:
+    numpy = None
 import tempfile
+import hashlib
+import copy
 import os
+import re
 import sqlite3
 
+# how many bytes from the end of a file are searched for root's closing tag
+_end_search_size = 65536
+# size of chunks read when hashing the source file
+_hash_chunk_size = 1024 * 1024
+
 class EmptyTableException(Exception):
     pass
 
+class UnsynchronizedChangesException(Exception):
+    pass
+
+class _FileRegion:
+    """
+    File-like object that reads a part of a binary file, surrounded with extra bytes
+    """
+
+    def __init__(self, f, start: int, end: int, head: bytes = b'', tail: bytes = b'', file_hash = None):
+        """
+        :param f: File opened in binary mode
+        :param start: Offset where the region begins
+        :param end: Offset where the region ends (exclusive)
+        :param head: Bytes read before the region
+        :param tail: Bytes read after the region
+        :param file_hash: Hash object updated with bytes read from the file
+        """
+        f.seek(start)
+        self._file = f
+        self._remaining = end - start
+        self._head = head
+        self._tail = tail
+        self._file_hash = file_hash
+
+    def read(self, size: int = -1):
+        if self._head:
+            data, self._head = self._head, None
+            return data
+        if self._remaining > 0:
+            data = self._file.read(self._remaining if size < 0 else min(size, self._remaining))
+            self._remaining -= len(data)
+            if data:
+                if self._file_hash:
+                    self._file_hash.update(data)
+                return data
+            self._remaining = 0
+        data, self._tail = self._tail or b'', None
+        return data
+
+class SqliteCursor(sqlite3.Cursor):
+    """
+    A regular sqlite3 cursor, extended with column oriented fetching
+    """
+
+    def __init__(self, connection, column_types: Dict[str, Dict[str, column.DataType]]):
+        """
+        :param connection: sqlite3 connection this cursor belongs to
+        :param column_types: A dict of table name as keys and dicts of column name : defined data type as values
+        """
+        super().__init__(connection)
+        self._column_types = column_types
+
+    def fetch_columns(self, batch_size: int = 10000):
+        """
+        Yields remaining rows of the query in batches of at most batch_size rows.
+        Each batch is a tuple of columns, ordered the same as cursor.description
+
+        :param batch_size: Maximum number of rows per batch
+        """
+        while True:
+            rows = self.fetchmany(batch_size)
+            if not rows:
+                break
+            yield tuple(list(values) for values in zip(*rows))
+
+    def fetch_numpy(self, batch_size: int = 10000, table: str = None):
+        """
+        Like fetch_columns, but each column is a numpy array. Columns defined as Integer
+        become int64 arrays (float64 if they contain NULLs), columns defined as Real
+        become float64 arrays with NULLs stored as nan. Other columns become object arrays.
+
+        :param batch_size: Maximum number of rows per batch
+        :param table: Table whose column definitions are used. If not given, a column's data type
+            is used when all tables that have a column with that name agree on it
+        """
+        if numpy is None:
+            raise ImportError("fetch_numpy requires numpy to be installed")
+
+        if table:
+            column_types = self._column_types.get(table, {})
+        else:
+            column_types = self.__merge_column_types()
+        data_types = [column_types.get(desc[0], None) for desc in self.description]
+        for columns in self.fetch_columns(batch_size):
+            yield tuple(self.__to_array(values, data_type) for values, data_type in zip(columns, data_types))
+
+    def __merge_column_types(self):
+        """
+        Returns a dict of column name : data type, leaving out columns
+        that are defined with different data types in different tables
+        """
+        column_types = {}
+        ambiguous_columns = set()
+        for table_column_types in self._column_types.values():
+            for column_name, data_type in table_column_types.items():
+                if column_name in column_types and type(column_types[column_name]) is not type(data_type):
+                    ambiguous_columns.add(column_name)
+                column_types[column_name] = data_type
+
+        for column_name in ambiguous_columns:
+            del column_types[column_name]
+        return column_types
+
+    def __to_array(self, values, data_type):
+        try:
+            if isinstance(data_type, column.Integer) and None not in values:
+                return numpy.array(values, dtype=numpy.int64)
+            elif isinstance(data_type, column.Integer) or isinstance(data_type, column.Real):
+                return numpy.array([numpy.nan if v is None else v for v in values], dtype=numpy.float64)
+        except (ValueError, TypeError):
+            # SQLite doesn't enforce column types, so a numeric column can still hold text
+            pass
+        array = numpy.empty(len(values), dtype=object)
+        array[:] = values
+        return array
+
 class SqliteDriver(Driver):
     """
     Sqlite Driver works by setting up a .sqlite copy of XML document,
@@ -20,7 +149,8 @@ class SqliteDriver(Driver):
     """
 
     def __init__(self, source, table_definitions = None, join_name: str = '_parentId', id_name: str = '_id',
-        text_name: str = '_text', in_memory_db: bool = False):
+        text_name: str = '_text', in_memory_db: bool = False, progress: Callable = None,
+        progress_interval: float = 1.0, progress_check_every: int = 256):
         """
         :param source: Path to .xml file to open, or file handle
         :param table_definitions: A dict of table name as keys table definitions as values
@@ -29,34 +159,255 @@ class SqliteDriver(Driver):
         :param text_name: Name of the column that stores node's text
         :param in_memory_db: If set to True, sqlite's database will be stored in RAM rather than as
             a temporary file on disk.
+        :param progress: Function called periodically with a Progress object while the document
+            is loaded. Returning askxml.CANCEL from it aborts loading with a CancelledException.
+        :param progress_interval: Minimum number of seconds between progress calls
+        :param progress_check_every: How many nodes are parsed or rows inserted between checking
+            whether progress_interval has passed
         """
+        self.source = source
         self.join_name = join_name
         self.id_name = id_name
+        self.text_name = text_name
+        self.in_memory_db = in_memory_db
+        self.progress = progress
+        self.progress_interval = progress_interval
+        self.progress_check_every = progress_check_every
+        self._table_definitions = table_definitions or []
+        self._column_types = {}
+        self.__load()
+
+    def __load(self):
+        """
+        Converts the whole source document into a new database
+        """
+        self.db_path = None
+        self._conn = None
+        # (offset of root's closing tag, hash of bytes before it) of the loaded file
+        self.__loaded_end = None
+        # root's closing tag, and the part of the file before root's opening tag,
+        # which are used to parse appended nodes
+        self.__closing_tag = None
+        self.__prolog = None
+        source = self.source
         sql_file = tempfile.TemporaryFile(mode='w+')
-        if table_definitions:
-            # convert table definitions from a list of tables into a dict
-            # where key is table name and value is a Table object
-            table_definitions = dict((table.table_name, table,) for table in table_definitions)
-
-        self.__converter = Converter(source, sql_file,
-            table_definitions=table_definitions, text_name=text_name,
-            join_name=join_name, id_name=id_name)
-        sql_file.seek(0)
-
-        if not in_memory_db:
-            handle, self.db_path = tempfile.mkstemp(suffix='.db')
-            os.close(handle)
+        source_file = None
+        root_end = None
+        file_hash = None
+        # convert table definitions from a list of tables into a dict
+        # where key is table name and value is a Table object.
+        # Converter alters table definitions, so work on a copy
+        table_definitions = dict((table.table_name, copy.deepcopy(table),) for table in self._table_definitions)
+
+        try:
+            if isinstance(source, str):
+                source = source_file = open(source, 'rb')
+                root_end = self.__find_root_end(source_file)
+                source_file.seek(0)
+
+            progress_reporter = None
+            if self.progress:
+                progress_reporter = ProgressReporter(self.progress, self.progress_interval, source,
+                    check_every=self.progress_check_every)
+
+            if root_end:
+                # parse only up to the closing tag found, and hash exactly what was parsed, so
+                # nodes appended while parsing are left for refresh
+                file_hash = hashlib.sha1()
+                source = _FileRegion(source_file, 0, root_end[0], tail=root_end[1], file_hash=file_hash)
+
+            self.__converter = Converter(source, sql_file,
+                table_definitions=table_definitions, text_name=self.text_name,
+                join_name=self.join_name, id_name=self.id_name, progress=progress_reporter)
+            sql_file.seek(0)
+
+            if not self.in_memory_db:
+                handle, self.db_path = tempfile.mkstemp(suffix='.db')
+                os.close(handle)
+            else:
+                self.db_path = ':memory:'
+
+            self._conn = sqlite3.connect(self.db_path)
+            # fill database with data
+            cursor = self._conn.cursor()
+            if progress_reporter:
+                progress_reporter.total_rows = progress_reporter.nodes_parsed
+                # the sql script begins with one CREATE TABLE statement per table
+                table_count = len(self.__converter.tables)
+                for statements_executed, query in enumerate(sql_file, 1):
+                    cursor.execute(query)
+                    if not statements_executed % progress_reporter.check_every:
+                        progress_reporter.report(
+                            min(max(statements_executed - table_count, 0), progress_reporter.total_rows))
+                progress_reporter.report(progress_reporter.total_rows, force=True)
+            else:
+                for query in sql_file:
+                    cursor.execute(query)
+            cursor.close()
+            self._conn.commit()
+
+            if root_end:
+                self.__loaded_end = (root_end[0], file_hash,)
+                self.__closing_tag = root_end[1]
+                self.__prolog = self.__read_prolog(source_file, root_end[2])
+        except:
+            # don't leave a partially filled database behind
+            self.close()
+            raise
+        finally:
+            sql_file.close()
+            if source_file:
+                source_file.close()
+
+        # number of rows changed by the driver itself, used to tell whether user changed any data
+        self.__loaded_changes = self._conn.total_changes
+        self._column_types.clear()
+        self._column_types.update(self.__collect_column_types())
+
+    def refresh(self, discard_changes: bool = True):
+        """
+        Loads elements that were appended to the source file since it was last loaded.
+        If the file was changed in any other way, the whole document is loaded again,
+        and cursors created before stop working. Checking for such changes reads
+        the already loaded part of the file, but doesn't parse it.
+
+        :param discard_changes: If False, raises UnsynchronizedChangesException instead of loading
+            the whole document again when data was changed since it was loaded
+        """
+        if not isinstance(self.source, str):
+            raise ValueError("Only documents opened from a file path can be refreshed")
+
+        with open(self.source, 'rb') as f:
+            root_end = self.__find_root_end(f, self.__closing_tag) if self.__closing_tag else None
+            file_hash = None
+            if root_end and self.__loaded_end and root_end[0] >= self.__loaded_end[0]:
+                file_hash = self.__hash_file(f, self.__loaded_end[0])
+
+            if file_hash is None or file_hash.digest() != self.__loaded_end[1].digest():
+                # not an append, load everything from scratch
+                self.__reload(discard_changes)
+                return
+            elif root_end[0] == self.__loaded_end[0]:
+                return
+            elif self.__prolog is None:
+                # appended nodes can't be parsed without the document's prolog
+                self.__reload(discard_changes)
+                return
+
+            if self.id_name:
+                # rows inserted with SQL take up IDs too
+                cursor = self._conn.cursor()
+                try:
+                    for table_name in self.__converter.tables:
+                        max_id = cursor.execute("SELECT MAX({}) FROM {}".format(self.id_name, table_name)).fetchone()[0]
+                        if max_id is not None and self.__converter.id_cache.get(table_name, 1) <= max_id:
+                            self.__converter.id_cache[table_name] = max_id + 1
+                finally:
+                    cursor.close()
+
+            sql_file = tempfile.TemporaryFile(mode='w+')
+            try:
+                # parse appended nodes as a document with the same prolog and root tag
+                region = _FileRegion(f, self.__loaded_end[0], root_end[0],
+                    head=self.__prolog + b'<' + root_end[2] + b'>', tail=root_end[1], file_hash=file_hash)
+                try:
+                    converter = Converter(region, sql_file, text_name=self.text_name,
+                        join_name=self.join_name, id_name=self.id_name, resume_from=self.__converter)
+                except SyntaxError:
+                    # appended part isn't well-formed on its own, try parsing the whole document instead
+                    self.__reload(discard_changes)
+                    return
+                sql_file.seek(0)
+                # sqlite3 doesn't open transactions for CREATE and ALTER statements, so begin one
+                # explicitly to be able to roll those back too
+                self._conn.commit()
+                cursor = self._conn.cursor()
+                try:
+                    cursor.execute('BEGIN')
+                    for query in sql_file:
+                        cursor.execute(query)
+                    self._conn.commit()
+                except:
+                    self._conn.rollback()
+                    raise
+                finally:
+                    cursor.close()
+            finally:
+                sql_file.close()
+
+        self.__converter = converter
+        self.__loaded_end = (root_end[0], file_hash,)
+        self.__loaded_changes = self._conn.total_changes
+        self._column_types.clear()
+        self._column_types.update(self.__collect_column_types())
+
+    def __reload(self, discard_changes: bool):
+        """
+        Loads the whole document again
+
+        :param discard_changes: If False, raises UnsynchronizedChangesException when data was changed
+        """
+        if not discard_changes and self._conn.total_changes != self.__loaded_changes:
+            raise UnsynchronizedChangesException("Source file was modified, and reloading it would discard changes to data")
+        self.close()
+        self.__load()
+
+    def __find_root_end(self, f, closing_tag: bytes = None):
+        """
+        Returns a tuple of (offset of root's closing tag, the closing tag, root's tag name,)
+        or None if it couldn't be found. The last closing tag in the file is assumed to be root's.
+
+        :param f: Source file opened in binary mode
+        :param closing_tag: Root's closing tag, if already known
+        """
+        size = f.seek(0, 2)
+        tail_offset = max(size - _end_search_size, 0)
+        f.seek(tail_offset)
+        tail = f.read()
+        if closing_tag:
+            closing_tags = list(re.finditer(re.escape(closing_tag), tail))
         else:
-            self.db_path = ':memory:'
+            closing_tags = list(re.finditer(rb'</([^\s>]+)\s*>', tail))
+        if not closing_tags:
+            return None
+        match = closing_tags[-1]
+        tag_name = re.match(rb'</([^\s>]+)', match.group(0)).group(1)
+        return tail_offset + match.start(), match.group(0), tag_name
+
+    def __read_prolog(self, f, tag_name: bytes):
+        """
+        Returns the part of the file before root's opening tag (XML declaration, DOCTYPE and comments),
+        or None if root's opening tag couldn't be found
+
+        :param f: Source file opened in binary mode
+        :param tag_name: Root's tag name
+        """
+        f.seek(0)
+        head = f.read(_end_search_size)
+        match = re.search(b'<' + re.escape(tag_name) + rb'[\s/>]', head)
+        return head[:match.start()] if match else None
+
+    def __hash_file(self, f, end_offset: int, file_hash = None, start_offset: int = 0):
+        """
+        Returns a hash object updated with file's contents. Hashes are compared on refresh
+        to tell whether the already loaded part of the file was modified.
 
-        self._conn = sqlite3.connect(self.db_path)
-        # fill database with data
-        cursor = self._conn.cursor()
-        for query in sql_file:
-            cursor.execute(query)
-        cursor.close()
-        self._conn.commit()
-        sql_file.close()
+        :param f: Source file opened in binary mode
+        :param end_offset: Offset where hashing stops
+        :param file_hash: Hash object to update. A new one is created if not given
+        :param start_offset: Offset where hashing begins
+        """
+        if file_hash is None:
+            file_hash = hashlib.sha1()
+        f.seek(start_offset)
+        remaining = end_offset - start_offset
+        while remaining > 0:
+            data = f.read(min(remaining, _hash_chunk_size))
+            if not data:
+                break
+            file_hash.update(data)
+            remaining -= len(data)
+        return file_hash
 
     def get_xml_root(self):
         return self.__converter.root_name, self.__converter.root_attrib
@@ -79,16 +430,35 @@ class SqliteDriver(Driver):
             cursor.close()
 
     def create_cursor(self):
-        return self._conn.cursor()
+        return self._conn.cursor(lambda conn: SqliteCursor(conn, self._column_types))
+
+    def __collect_column_types(self):
+        """
+        Returns a dict of table name : dict of column name : data type.
+        Undefined columns are stored as Text
+        """
+        column_types = {}
+        for table_name, columns in self.__converter.tables.items():
+            table_definition = self.__converter.table_definitions.get(table_name, None)
+            column_types[table_name] = {}
+            for column_name in columns:
+                try:
+                    data_type = table_definition.get_column(column_name).data_type
+                except (KeyError, AttributeError):
+                    data_type = column.Column.create_default(column_name).data_type
+                column_types[table_name][column_name] = data_type
+        return column_types
 
     def close(self):
-        self._conn.close()
-        if self.db_path != ':memory:':
+        if self._conn:
+            self._conn.close()
+        if self.db_path and self.db_path != ':memory:':
             os.remove(self.db_path)
 
 class Converter:
     def __init__(self, source, outfile, table_definitions: Dict[str, table.Table] = None,
-        text_name: str = None, join_name: str = None, id_name: str = None):
+        text_name: str = None, join_name: str = None, id_name: str = None, progress: ProgressReporter = None,
+        resume_from: 'Converter' = None):
         """
         Converts an XML file to a .sqlite script
 
@@ -97,11 +467,17 @@ class Converter:
         :param table_definitions: A dict of table name as keys table definitions as values
         :param join_name: Name of the column that stores parent's ID. Set to None to not join.
         :param id_name: Name of the column that stores node's ID. Set to None to not generate an ID.
+        :param progress: Progress reporter notified about parsed nodes
+        :param resume_from: Converter that processed an earlier part of the document. Tables, IDs
+            and table definitions are carried over from it, and existing tables are altered instead of created.
         """
-        if not table_definitions:
+        if resume_from:
+            table_definitions = copy.deepcopy(resume_from.table_definitions)
+        elif not table_definitions:
             table_definitions = {}
 
         self.table_definitions = table_definitions
+        self.progress = progress
         self.join_name = join_name
         self.id_name = id_name
         self.text_name = text_name
@@ -117,21 +493,41 @@ class Converter:
         self.root_attrib = root.attrib
         # a dict that holds all found tables and their columns
         self.tables: Dict[str, AbstractSet[str]] = {}
-        # update found tables with user defined table definitions
-        for table_name, table_definition in table_definitions.items():
-            # also generate join keys for predefined table
-            self.__generate_table_meta_columns(table_name)
-            self.tables[table_name] = set(column_definition.column_name for column_definition in table_definition.column_definitions)
+        # tables that already exist in the database, and their columns
+        previous_tables: Dict[str, AbstractSet[str]] = {}
+        if resume_from:
+            self.root_name = resume_from.root_name
+            self.root_attrib = resume_from.root_attrib
+            self.id_cache.update(resume_from.id_cache)
+            self._generated_meta_columns_cache.update(resume_from._generated_meta_columns_cache)
+            previous_tables = resume_from.tables
+            self.tables = dict((table_name, set(columns),) for table_name, columns in previous_tables.items())
+        else:
+            # update found tables with user defined table definitions
+            for table_name, table_definition in table_definitions.items():
+                # also generate join keys for predefined table
+                self.__generate_table_meta_columns(table_name)
+                self.tables[table_name] = set(column_definition.column_name for column_definition in table_definition.column_definitions)
 
         # generate insert queries in a temporary file
         self.inserts_file = tempfile.TemporaryFile(mode='w+')
-        self.__parse_node(root, None)
+        try:
+            self.__parse_node(root, None)
+        except:
+            self.inserts_file.close()
+            raise
         self.inserts_file.seek(0)
 
         # generate create table statements
         constraint_definitions = []
         for table_name, columns in self.tables.items():
             table_definition = table_definitions.get(table_name, None)
+            table_constraint_definitions = []
+            if self.join_name and self.join_name in columns:
+                # children are looked up by parent's ID
+                table_constraint_definitions.append('CREATE INDEX {table}_{join_name}_index ON {table} ({join_name})'.format(
+                    table=table_name,
+                    join_name=self.join_name))
 
             # create column parameters (column_name column_type [key])
             column_definitions = []
@@ -159,7 +555,7 @@ class Converter:
                     if isinstance(constraint, column.UniqueIndex) or isinstance(constraint, column.Index):
                         constraint_name = '_'.join(constraint.column_names) + '_index'
                         unique_sql = 'UNIQUE' if isinstance(constraint, column.UniqueIndex) else ''
-                        constraint_definitions.append('CREATE {} INDEX {} ON {} ({})'.format(
+                        table_constraint_definitions.append('CREATE {} INDEX {} ON {} ({})'.format(
                             unique_sql,
                             constraint_name,
                             table_name,
@@ -177,6 +573,14 @@ class Converter:
                                 column_definitions[i] = definition + ' PRIMARY KEY'
                                 break
 
+            if table_name in previous_tables:
+                # table already exists, only add columns that weren't seen before
+                for definition in column_definitions:
+                    if definition.split(' ', 1)[0] not in previous_tables[table_name]:
+                        outfile.write('ALTER TABLE {} ADD COLUMN {};\n'.format(table_name, definition))
+                continue
+
+            constraint_definitions.extend(table_constraint_definitions)
             outfile.write('CREATE TABLE {} ({});\n'.format(table_name, ','.join(column_definitions)))
 
         # copy insert queries from temp file to out file
@@ -251,6 +655,11 @@ class Converter:
                 ','.join(column_values)
             ))
 
+            if self.progress:
+                self.progress.nodes_parsed += 1
+                if not self.progress.nodes_parsed % self.progress.check_every:
+                    self.progress.report()
+
             # update table definitions
             if not table_name in self.tables:
                 self.tables[table_name] = set(node.attrib.keys())
@@ -0,0 +1,271 @@
+"""
+Compiles a subset of XPath into SQL statements over converted tables.
+
+Supported are child (/) and descendant (//) steps, * name tests, attribute (@name)
+and text() selection as the last step, and predicates:
+[@name], [@name="value"], [text()="value"] with =, !=, <, <=, >, >= operators,
+and positional predicates like [2]. Position is counted among siblings with
+the same tag that match preceding predicates.
+"""
+from typing import Dict, AbstractSet, List, Tuple
+import re
+
+class InvalidPathException(Exception):
+    pass
+
+# statement used when a path can't match anything
+_empty_query = 'SELECT NULL WHERE 0'
+
+_token_regex = re.compile(r"""\s*(?:
+    (?P<string>"[^"]*"|'[^']*')|
+    (?P<number>-?\d+(?:\.\d+)?)|
+    (?P<text>text\(\))|
+    (?P<name>[^\s/\[\]@=!<>()'"*]+)|
+    (?P<symbol>//|/|\[|\]|@|\*|!=|<=|>=|=|<|>)
+    )""", re.VERBOSE)
+
+_comparison_operators = ('=', '!=', '<', '<=', '>', '>=')
+
+class _Step:
+    def __init__(self, descendant: bool, name: str):
+        """
+        :param descendant: Whether the step uses descendant axis, rather than child axis
+        :param name: Tag name, or * to match any tag
+        """
+        self.descendant = descendant
+        self.name = name
+        # a list of tuples (kind, column or position, operator, value,)
+        # where kind is one of 'attribute', 'text', 'position'
+        self.predicates: List[Tuple] = []
+
+def _tokenize(path: str):
+    tokens = []
+    position = 0
+    path = path.rstrip()
+    while position < len(path):
+        match = _token_regex.match(path, position)
+        if not match:
+            raise InvalidPathException("Unexpected character at {} in path '{}'".format(position, path))
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == 'string':
+            value = value[1:-1]
+        elif kind == 'number':
+            value = float(value) if '.' in value else int(value)
+        tokens.append((kind, value,))
+        position = match.end()
+    return tokens
+
+def _parse(path: str):
+    """
+    Returns a tuple of (absolute, steps, selected,) where selected is
+    None when whole nodes are selected, ('attribute', name) or ('text', None)
+    """
+    tokens = _tokenize(path)
+    if not tokens:
+        raise InvalidPathException("Path is empty")
+
+    def expect(kind, value=None):
+        if not tokens or tokens[0][0] != kind or (value is not None and tokens[0][1] != value):
+            raise InvalidPathException("Expected {} in path '{}'".format(value or kind, path))
+        return tokens.pop(0)[1]
+
+    def peek(value):
+        return tokens and tokens[0][0] == 'symbol' and tokens[0][1] == value
+
+    absolute = False
+    descendant = False
+    if peek('/') or peek('//'):
+        descendant = tokens.pop(0)[1] == '//'
+        absolute = not descendant
+
+    steps = []
+    selected = None
+    while True:
+        if peek('@'):
+            tokens.pop(0)
+            selected = ('attribute', expect('name'),)
+        elif tokens and tokens[0][0] == 'text':
+            tokens.pop(0)
+            selected = ('text', None,)
+        else:
+            if peek('*'):
+                tokens.pop(0)
+                step = _Step(descendant, '*')
+            else:
+                step = _Step(descendant, expect('name'))
+            while peek('['):
+                tokens.pop(0)
+                step.predicates.append(_parse_predicate(tokens, expect, peek))
+                expect('symbol', ']')
+            steps.append(step)
+
+        if not tokens:
+            break
+        if selected:
+            raise InvalidPathException("Attributes and text() can only be selected in the last step of '{}'".format(path))
+        if not (peek('/') or peek('//')):
+            raise InvalidPathException("Expected / in path '{}'".format(path))
+        descendant = tokens.pop(0)[1] == '//'
+
+    return absolute, steps, selected
+
+def _parse_predicate(tokens, expect, peek):
+    if tokens and tokens[0][0] == 'number':
+        position = tokens.pop(0)[1]
+        if not isinstance(position, int) or position < 1:
+            raise InvalidPathException("Positions must be integers starting from 1")
+        return ('position', position, None, None,)
+
+    if tokens and tokens[0][0] == 'text':
+        tokens.pop(0)
+        kind, column_name = 'text', None
+    else:
+        expect('symbol', '@')
+        kind, column_name = 'attribute', expect('name')
+
+    if tokens and tokens[0][0] == 'symbol' and tokens[0][1] in _comparison_operators:
+        operator = tokens.pop(0)[1]
+        if not tokens or tokens[0][0] not in ('string', 'number'):
+            raise InvalidPathException("Expected a value after '{}'".format(operator))
+        return (kind, column_name, operator, tokens.pop(0)[1],)
+    elif kind == 'text':
+        raise InvalidPathException("text() predicate requires a comparison")
+    return (kind, column_name, None, None,)
+
+def compile_path(path: str, tables: Dict[str, AbstractSet[str]], root_name: str,
+        join_name: str = '_parentId', id_name: str = '_id', text_name: str = '_text') -> Tuple[str, Dict]:
+    """
+    Compiles a path into an SQL statement. Returns a tuple of (sql, parameters,)
+
+    :param path: Path to compile, eg. someParent[@name="Jerry"]/someChild/@name
+    :param tables: A dict of table name as keys and a set of its column names as values
+    :param root_name: Tag of document's root node
+    :param join_name: Name of the column that stores parent's ID
+    :param id_name: Name of the column that stores node's ID
+    :param text_name: Name of the column that stores node's text
+    """
+    absolute, steps, selected = _parse(path)
+    if absolute:
+        # absolute paths begin with the root node
+        if not steps or steps[0].name not in (root_name, '*') or steps[0].descendant:
+            return _empty_query, {}
+        if steps[0].predicates:
+            raise InvalidPathException("Predicates on the root node are not supported")
+        steps.pop(0)
+    if not steps:
+        raise InvalidPathException("Path '{}' doesn't select any table".format(path))
+
+    parameters = {}
+    queries = []
+    for table_name in sorted(tables):
+        columns = tables[table_name]
+        segments = table_name.split('_')
+        selected_column = None
+        if selected:
+            selected_column = text_name if selected[0] == 'text' else selected[1]
+            if selected_column not in columns:
+                continue
+        assignments = list(_assign_steps(steps, segments, 0, 0))
+        if not assignments:
+            continue
+
+        compiled_assignments = []
+        used_depths = set([len(segments)])
+        for depths in assignments:
+            conditions = []
+            for step, depth in zip(steps, depths):
+                ancestor_name = '_'.join(segments[:depth])
+                conditions.extend(_compile_predicates(step.predicates, 't{}'.format(depth), ancestor_name,
+                    tables.get(ancestor_name, set()), parameters, join_name, id_name, text_name, depth > 1))
+                if step.predicates:
+                    used_depths.add(depth)
+            compiled_assignments.append(' AND '.join(conditions) if conditions else '1')
+
+        # join ancestors from the shallowest one that has predicates
+        first_depth = min(used_depths)
+        from_sql = '{} AS t{}'.format('_'.join(segments[:first_depth]), first_depth)
+        for depth in range(first_depth + 1, len(segments) + 1):
+            from_sql += ' INNER JOIN {table} AS t{depth} ON t{depth}.{join_name} = t{parent_depth}.{id_name}'.format(
+                table='_'.join(segments[:depth]),
+                depth=depth,
+                parent_depth=depth - 1,
+                join_name=join_name,
+                id_name=id_name)
+
+        where_sql = ' OR '.join('(' + a + ')' for a in compiled_assignments)
+        if selected is None:
+            select_sql = 't{}.*'.format(len(segments))
+        else:
+            select_sql = 't{}.{}'.format(len(segments), selected_column)
+            # nodes without the attribute or text don't produce a result
+            where_sql = '{} IS NOT NULL AND ({})'.format(select_sql, where_sql)
+        queries.append('SELECT {} FROM {} WHERE {}'.format(select_sql, from_sql, where_sql))
+        selected_alias = 't{}'.format(len(segments))
+
+    if not queries:
+        return _empty_query, {}
+    if len(queries) == 1:
+        # rows of a single table can be returned in document order
+        return '{} ORDER BY {}.{}'.format(queries[0], selected_alias, id_name), parameters
+    if selected is None:
+        raise InvalidPathException("Path '{}' matches nodes from several tables. Select an attribute or text() instead".format(path))
+    return ' UNION ALL '.join(queries), parameters
+
+def _assign_steps(steps, segments, step_index, depth):
+    """
+    Yields every way steps can be matched to segments of a table name, as a list
+    of depths, one per step. A table matches when its last segment is matched by the last step.
+    """
+    if step_index == len(steps):
+        if depth == len(segments):
+            yield []
+        return
+
+    step = steps[step_index]
+    candidates = range(depth + 1, len(segments) + 1) if step.descendant else [depth + 1]
+    for candidate in candidates:
+        if candidate > len(segments) or (step.name != '*' and segments[candidate - 1] != step.name):
+            continue
+        for rest in _assign_steps(steps, segments, step_index + 1, candidate):
+            yield [candidate] + rest
+
+def _compile_predicates(predicates, alias, table_name, columns, parameters, join_name, id_name, text_name, has_parent):
+    conditions = []
+    for i, (kind, target, operator, value) in enumerate(predicates):
+        if kind == 'position':
+            # count preceding siblings from the same table that match preceding predicates.
+            # Nested positional predicates need their own alias, so derive it from the outer one
+            sibling_alias = alias + 's'
+            sibling_conditions = ['{sibling}.{id_name} <= {alias}.{id_name}'.format(
+                sibling=sibling_alias, id_name=id_name, alias=alias)]
+            if has_parent:
+                sibling_conditions.append('{sibling}.{join_name} = {alias}.{join_name}'.format(
+                    sibling=sibling_alias, join_name=join_name, alias=alias))
+            sibling_conditions.extend(_compile_predicates(predicates[:i], sibling_alias, table_name, columns, parameters,
+                join_name, id_name, text_name, has_parent))
+            parameter_name = 'p{}'.format(len(parameters))
+            parameters[parameter_name] = target
+            conditions.append('(SELECT COUNT(*) FROM {} AS {} WHERE {}) = :{}'.format(
+                table_name, sibling_alias, ' AND '.join(sibling_conditions), parameter_name))
+            continue
+
+        column_name = text_name if kind == 'text' else target
+        if column_name not in columns:
+            # a missing attribute never matches
+            conditions.append('0')
+        elif operator is None:
+            conditions.append('{}.{} IS NOT NULL'.format(alias, column_name))
+        else:
+            parameter_name = 'p{}'.format(len(parameters))
+            parameters[parameter_name] = value
+            column_sql = '{}.{}'.format(alias, column_name)
+            if isinstance(value, str):
+                conditions.append('{} {} :{}'.format(column_sql, operator, parameter_name))
+            else:
+                # attributes are stored as TEXT by default, which would compare as strings.
+                # Values that aren't numbers never match, like NaN in XPath
+                conditions.append("(TRIM({column}) GLOB '*[0-9]*' AND NOT TRIM({column}) GLOB '*[^0-9.eE+-]*'"
+                    " AND CAST({column} AS NUMERIC) {operator} :{parameter})".format(
+                        column=column_sql, operator=operator, parameter=parameter_name))
+    return conditions
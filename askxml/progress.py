@@ -0,0 +1,80 @@
+from collections import namedtuple
+from typing import Callable
+import time
+
+Progress = namedtuple('Progress', ['bytes_read', 'total_bytes', 'nodes_parsed', 'rows_inserted', 'eta'])
+Progress.__doc__ = """
+Snapshot of document loading progress, passed to the progress callback.
+total_bytes and eta are None when they can't be determined.
+"""
+
+# return this from a progress callback to abort loading
+CANCEL = object()
+
+class CancelledException(Exception):
+    pass
+
+class ProgressReporter:
+    """
+    Throttles calls to a user supplied progress callback
+    """
+
+    def __init__(self, callback: Callable[[Progress], object], interval: float, source, check_every: int = 256):
+        """
+        :param callback: Function called with a Progress object. Can return CANCEL to abort loading
+        :param interval: Minimum number of seconds between callback calls
+        :param source: File handle the XML document is being read from
+        :param check_every: How many nodes are parsed or rows inserted between checking the clock
+        """
+        self.callback = callback
+        self.interval = interval
+        self.check_every = check_every
+        self.nodes_parsed = 0
+        self.total_rows = None
+        self._source = getattr(source, 'buffer', source)
+        self._start_time = time.monotonic()
+        self._last_report = self._start_time
+
+        try:
+            self._start_position = self._source.tell()
+            self.total_bytes = self._source.seek(0, 2) - self._start_position
+            self._source.seek(self._start_position)
+        except (AttributeError, OSError):
+            self._start_position = None
+            self.total_bytes = None
+
+    def bytes_read(self):
+        if self._start_position is None:
+            return None
+        try:
+            return min(self._source.tell() - self._start_position, self.total_bytes)
+        except (ValueError, OSError):
+            # source was closed by the parser
+            return self.total_bytes
+
+    def report(self, rows_inserted: int = 0, force: bool = False):
+        """
+        Calls the callback if enough time has passed since the last call.
+        Raises CancelledException if the callback returned CANCEL
+
+        :param rows_inserted: Number of rows inserted into the database so far
+        :param force: Call the callback regardless of time passed
+        """
+        now = time.monotonic()
+        if not force and now - self._last_report < self.interval:
+            return
+        self._last_report = now
+
+        bytes_read = self.bytes_read()
+        # parsing and inserting are weighted equally
+        done = 0.0
+        if self.total_rows is not None:
+            done = 0.5 + (0.5 * rows_inserted / self.total_rows if self.total_rows else 0.5)
+        elif self.total_bytes:
+            done = 0.5 * bytes_read / self.total_bytes
+        elapsed = now - self._start_time
+        eta = elapsed * (1 - done) / done if done > 0 else None
+
+        progress = Progress(bytes_read, self.total_bytes, self.nodes_parsed, rows_inserted, eta)
+        if self.callback(progress) is CANCEL:
+            raise CancelledException("Loading XML document was cancelled")
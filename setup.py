@@ -26,4 +26,7 @@ setup(
     ],
     keywords='xml sql statements query',
     packages=find_packages(exclude=['contrib', 'docs', 'tests']),
+    extras_require={
+        'numpy': ['numpy'],
+    },
 )
\ No newline at end of file
@@ -0,0 +1,60 @@
+from askxml import *
+import xml.etree.ElementTree as ET
+import tempfile
+import unittest
+import json
+import csv
+
+_xml_file_simple =  """
+<XML>
+    <RootTable first="1" second="&quot;2&amp;">
+        <Child>Hello &lt;3</Child>
+        <Child third="3"></Child>
+    </RootTable>
+    <RootTable first="2" />
+    <RootTableSecond>Hi</RootTableSecond>
+</XML>"""
+
+class TestExport(unittest.TestCase):
+    def test_export_xml(self):
+        with tempfile.SpooledTemporaryFile(mode='w+') as f, tempfile.SpooledTemporaryFile(mode='w+') as out:
+            f.write(_xml_file_simple)
+            f.seek(0)
+            with AskXML(f, persist_data=False) as conn:
+                conn.export("SELECT * FROM RootTable WHERE first = '1'", out, table='RootTable')
+            out.seek(0)
+            root = ET.parse(out).getroot()
+
+            self.assertEqual(root.tag, 'XML')
+            children = [child for child in root]
+            self.assertEqual(len(children), 1)
+            self.assertEqual(children[0].tag, 'RootTable')
+            self.assertEqual(children[0].attrib, {'first': '1', 'second': '"2&'})
+            RootTable_children = [child for child in children[0]]
+            self.assertEqual(len(RootTable_children), 2)
+            self.assertEqual(RootTable_children[0].tag, 'Child')
+            self.assertEqual(RootTable_children[0].text, 'Hello <3')
+            self.assertEqual(RootTable_children[1].attrib, {'third': '3'})
+
+    def test_export_csv(self):
+        with tempfile.SpooledTemporaryFile(mode='w+') as f, tempfile.SpooledTemporaryFile(mode='w+') as out:
+            f.write(_xml_file_simple)
+            f.seek(0)
+            with AskXML(f, persist_data=False) as conn:
+                conn.export("SELECT first, second FROM RootTable ORDER BY _id ASC", out, format='csv')
+            out.seek(0)
+            rows = list(csv.reader(out))
+            self.assertEqual(rows, [['first', 'second'], ['1', '"2&'], ['2', '']])
+
+    def test_export_jsonl(self):
+        with tempfile.SpooledTemporaryFile(mode='w+') as f, tempfile.SpooledTemporaryFile(mode='w+') as out:
+            f.write(_xml_file_simple)
+            f.seek(0)
+            with AskXML(f, persist_data=False) as conn:
+                conn.export("SELECT _id, _text FROM RootTable_Child ORDER BY _id ASC", out, format='jsonl')
+            out.seek(0)
+            rows = [json.loads(line) for line in out]
+            self.assertEqual(rows, [{'_id': 1, '_text': 'Hello <3'}, {'_id': 2, '_text': None}])
+
+if __name__ == '__main__':
+    unittest.main()
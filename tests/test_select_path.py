@@ -0,0 +1,74 @@
+from askxml import *
+import tempfile
+import unittest
+
+_xml_file_family = """
+<XML>
+    <someParent name="Jerry">
+        <someChild name="Morty"><pet kind="dog" /></someChild>
+        <someChild name="Summer">Hi</someChild>
+    </someParent>
+    <someParent name="Rick">
+        <someChild name="Beth"><someChild name="Nested" /></someChild>
+    </someParent>
+</XML>"""
+
+class TestSelectPath(unittest.TestCase):
+    def select(self, path):
+        with tempfile.SpooledTemporaryFile(mode='w+') as f:
+            f.write(_xml_file_family)
+            f.seek(0)
+            with AskXML(f, persist_data=False) as conn:
+                cursor = conn.select_path(path)
+                result = cursor.fetchall()
+                cursor.close()
+                return result
+
+    def test_child_steps(self):
+        self.assertEqual(self.select('someParent[@name="Jerry"]/someChild/@name'), [('Morty',), ('Summer',)])
+        self.assertEqual(self.select('/XML/someParent/someChild/someChild/@name'), [('Nested',)])
+        self.assertEqual(self.select('/other/someParent/@name'), [])
+
+    def test_descendant_steps(self):
+        self.assertEqual(sorted(self.select('//someChild/@name')), [('Beth',), ('Morty',), ('Nested',), ('Summer',)])
+        self.assertEqual(self.select('someParent[@name="Rick"]//someChild/someChild/@name'), [('Nested',)])
+        self.assertEqual(self.select('//*[@kind]/@kind'), [('dog',)])
+
+    def test_predicates(self):
+        self.assertEqual(self.select('someParent/someChild[text()="Hi"]/@name'), [('Summer',)])
+        self.assertEqual(self.select('someParent/someChild[2]/@name'), [('Summer',)])
+        self.assertEqual(self.select('someParent/someChild[@name!="Morty"][1]/@name'), [('Summer',), ('Beth',)])
+        self.assertEqual(self.select('someParent[@missing]/@name'), [])
+
+    def test_numeric_comparison(self):
+        with tempfile.SpooledTemporaryFile(mode='w+') as f:
+            f.write('<XML><p name="a" age="10" /><p name="b" age="3" /><p name="c" age="5" />' +
+                '<p name="d" age="unknown" /></XML>')
+            f.seek(0)
+            with AskXML(f, persist_data=False) as conn:
+                cursor = conn.select_path('p[@age>3]/@name')
+                self.assertEqual(cursor.fetchall(), [('a',), ('c',)])
+                cursor.close()
+                cursor = conn.select_path('p[@age<1]/@name')
+                self.assertEqual(cursor.fetchall(), [])
+                cursor.close()
+
+    def test_chained_positions(self):
+        self.assertEqual(self.select('someParent/someChild[1][1]/@name'), [('Morty',), ('Beth',)])
+        self.assertEqual(self.select('someParent[2]/someChild[1][1]/@name'), [('Beth',)])
+
+    def test_select_nodes_and_text(self):
+        self.assertEqual(self.select('someParent/someChild/text()'), [('Hi',)])
+        self.assertEqual(self.select('//pet/@name'), [])
+        self.assertEqual(sorted(self.select('//*/@kind')), [('dog',)])
+        rows = self.select('someParent[@name="Rick"]')
+        self.assertEqual(len(rows), 1)
+        self.assertTrue('Rick' in rows[0])
+
+    def test_invalid_paths(self):
+        for path in ['', 'someParent[', 'someParent/@name/someChild', 'someParent[0]', '//someChild']:
+            with self.assertRaises(InvalidPathException):
+                self.select(path)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,15 @@
-from askxml.driver.sqlite_driver import SqliteDriver
+from askxml.driver.sqlite_driver import SqliteDriver, UnsynchronizedChangesException
 from askxml.table import Table
 from askxml.column import *
+from askxml.progress import CANCEL, CancelledException
 import tempfile
+import glob
+import os
 import unittest
+try:
+    import numpy
+except ModuleNotFoundError:
+    numpy = None
 
 _xml_file_simple =  """
 <XML>
@@ -111,5 +118,270 @@ class TestSqliteDriver(unittest.TestCase):
             cursor.close()
             driver.close()
 
+    def test_join_columns_are_indexed(self):
+        with tempfile.SpooledTemporaryFile(mode='w+') as f:
+            f.write(_xml_file_simple)
+            f.seek(0)
+            driver = SqliteDriver(source=f)
+            cursor = driver.create_cursor()
+            result = cursor.execute("SELECT tbl_name FROM sqlite_master WHERE type='index' AND sql LIKE '%_parentId%'").fetchall()
+            self.assertEqual(result, [('RootTable_Child',)])
+            cursor.close()
+            driver.close()
+
+    def test_fetch_columns(self):
+        with tempfile.SpooledTemporaryFile(mode='w+') as f:
+            f.write(_xml_file_simple)
+            f.seek(0)
+            driver = SqliteDriver(source=f)
+            cursor = driver.create_cursor()
+            cursor.execute("SELECT _id, first FROM RootTable ORDER BY _id ASC")
+            batches = list(cursor.fetch_columns(batch_size=1))
+            self.assertEqual(len(batches), 2)
+            self.assertEqual(batches[0], ([1], ['1']))
+            self.assertEqual(batches[1], ([2], [None]))
+            cursor.close()
+            driver.close()
+
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def test_fetch_numpy(self):
+        with tempfile.SpooledTemporaryFile(mode='w+') as f:
+            f.write(_xml_file_simple)
+            f.seek(0)
+            driver = SqliteDriver(source=f, table_definitions=[Table('RootTable', Column('first', Real()))])
+            cursor = driver.create_cursor()
+            cursor.execute("SELECT _id, first, second FROM RootTable ORDER BY _id ASC")
+            batches = list(cursor.fetch_numpy())
+            self.assertEqual(len(batches), 1)
+            ids, first, second = batches[0]
+            self.assertEqual(ids.dtype, numpy.int64)
+            self.assertEqual(ids.tolist(), [1, 2])
+            self.assertEqual(first.dtype, numpy.float64)
+            self.assertEqual(first[0], 1.0)
+            self.assertTrue(numpy.isnan(first[1]))
+            self.assertEqual(second.dtype, object)
+            self.assertEqual(second.tolist(), ['2', None])
+            cursor.close()
+            driver.close()
+
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def test_fetch_numpy_column_types(self):
+        with tempfile.SpooledTemporaryFile(mode='w+') as f:
+            f.write(_xml_file_simple.replace('third="3"', 'first="3"'))
+            f.seek(0)
+            # RootTable_Child.first isn't defined, so it's Text and differs from RootTable's definition
+            driver = SqliteDriver(source=f, table_definitions=[Table('RootTable', Column('first', Integer()))])
+            cursor = driver.create_cursor()
+            cursor.execute("SELECT first FROM RootTable_Child WHERE first IS NOT NULL")
+            self.assertEqual(next(cursor.fetch_numpy())[0].dtype, object)
+            cursor.execute("SELECT first FROM RootTable WHERE _id=1")
+            self.assertEqual(next(cursor.fetch_numpy(table='RootTable'))[0].dtype, numpy.int64)
+            cursor.close()
+            driver.close()
+
+        with tempfile.SpooledTemporaryFile(mode='w+') as f:
+            f.write(_xml_file_simple.replace('third="3"', 'first="3"'))
+            f.seek(0)
+            # first is defined differently in two tables, so only table's own definition can be used
+            driver = SqliteDriver(source=f, table_definitions=[Table('RootTable', Column('first', Integer())),
+                Table('RootTable_Child', Column('first', Real()))])
+            cursor = driver.create_cursor()
+            cursor.execute("SELECT first FROM RootTable WHERE _id=1")
+            self.assertEqual(next(cursor.fetch_numpy())[0].dtype, object)
+            cursor.execute("SELECT first FROM RootTable WHERE _id=1")
+            self.assertEqual(next(cursor.fetch_numpy(table='RootTable'))[0].dtype, numpy.int64)
+            cursor.close()
+            driver.close()
+
+    def test_progress(self):
+        with tempfile.SpooledTemporaryFile(mode='w+') as f:
+            f.write(_xml_file_simple)
+            f.seek(0)
+            reports = []
+            driver = SqliteDriver(source=f, progress=reports.append, progress_interval=0)
+            self.assertTrue(reports)
+            self.assertEqual(reports[-1].bytes_read, len(_xml_file_simple))
+            self.assertEqual(reports[-1].total_bytes, len(_xml_file_simple))
+            self.assertEqual(reports[-1].nodes_parsed, 5)
+            self.assertEqual(reports[-1].rows_inserted, 5)
+            self.assertEqual(reports[-1].eta, 0)
+            driver.close()
+
+    def test_progress_cancel(self):
+        # cancel while parsing, before the database is filled
+        reports = []
+        def cancel_while_parsing(progress):
+            reports.append(progress)
+            return CANCEL if progress.nodes_parsed >= 2 else None
+
+        with tempfile.SpooledTemporaryFile(mode='w+') as f:
+            f.write(_xml_file_simple)
+            f.seek(0)
+            databases = set(glob.glob(os.path.join(tempfile.gettempdir(), '*.db')))
+            with self.assertRaises(CancelledException):
+                SqliteDriver(source=f, progress=cancel_while_parsing, progress_interval=0, progress_check_every=1)
+            self.assertEqual(reports[-1].nodes_parsed, 2)
+            self.assertEqual(reports[-1].rows_inserted, 0)
+            self.assertEqual(set(glob.glob(os.path.join(tempfile.gettempdir(), '*.db'))) - databases, set())
+
+        # cancel while inserting, after the database was created
+        reports = []
+        def cancel_while_inserting(progress):
+            reports.append(progress)
+            return CANCEL if progress.rows_inserted > 0 else None
+
+        with tempfile.SpooledTemporaryFile(mode='w+') as f:
+            f.write(_xml_file_simple)
+            f.seek(0)
+            databases = set(glob.glob(os.path.join(tempfile.gettempdir(), '*.db')))
+            with self.assertRaises(CancelledException):
+                SqliteDriver(source=f, progress=cancel_while_inserting, progress_interval=0, progress_check_every=1)
+            self.assertGreater(reports[-1].rows_inserted, 0)
+            self.assertLess(reports[-1].rows_inserted, 5)
+            self.assertEqual(set(glob.glob(os.path.join(tempfile.gettempdir(), '*.db'))) - databases, set())
+
+    def test_refresh_appended(self):
+        with tempfile.NamedTemporaryFile(mode='w+', suffix='.xml') as f:
+            f.write(_xml_file_simple)
+            f.flush()
+            driver = SqliteDriver(source=f.name)
+            f.seek(0)
+            f.write(_xml_file_simple.replace('</XML>',
+                '<RootTable fourth="4"><Child>Bye</Child></RootTable><NewTable /></XML>'))
+            f.flush()
+            driver.refresh()
+            cursor = driver.create_cursor()
+            result = cursor.execute("SELECT _id, fourth FROM RootTable ORDER BY _id ASC").fetchall()
+            self.assertEqual(result, [(1, None), (2, None), (3, '4')])
+            result = cursor.execute("SELECT _id, _parentId, _text FROM RootTable_Child ORDER BY _id ASC").fetchall()
+            self.assertEqual(result[-1], (3, 3, 'Bye'))
+            result = cursor.execute("SELECT COUNT(*) FROM NewTable").fetchall()
+            self.assertEqual(result[0][0], 1)
+            cursor.close()
+            driver.close()
+
+    def test_refresh_modified(self):
+        with tempfile.NamedTemporaryFile(mode='w+', suffix='.xml') as f:
+            f.write(_xml_file_simple)
+            f.flush()
+            driver = SqliteDriver(source=f.name)
+            f.seek(0)
+            f.truncate()
+            f.write('<XML><RootTable first="5" /></XML>')
+            f.flush()
+            driver.refresh()
+            cursor = driver.create_cursor()
+            result = cursor.execute("SELECT _id, first FROM RootTable").fetchall()
+            self.assertEqual(result, [(1, '5')])
+            cursor.close()
+            driver.close()
+
+    def test_refresh_after_insert(self):
+        with tempfile.NamedTemporaryFile(mode='w+', suffix='.xml') as f:
+            f.write(_xml_file_simple)
+            f.flush()
+            driver = SqliteDriver(source=f.name)
+            cursor = driver.create_cursor()
+            cursor.execute("INSERT INTO RootTable (first) VALUES ('inserted')")
+            f.seek(0)
+            f.write(_xml_file_simple.replace('</XML>', '<RootTable first="appended" /></XML>'))
+            f.flush()
+            driver.refresh()
+            result = cursor.execute("SELECT _id, first FROM RootTable ORDER BY _id ASC").fetchall()
+            self.assertEqual(result, [(1, '1'), (2, None), (3, 'inserted'), (4, 'appended')])
+            cursor.close()
+            driver.close()
+
+    def test_refresh_failed(self):
+        with tempfile.NamedTemporaryFile(mode='w+', suffix='.xml') as f:
+            f.write(_xml_file_simple)
+            f.flush()
+            driver = SqliteDriver(source=f.name)
+            f.seek(0)
+            # a column named after an SQL keyword makes the ALTER TABLE statement fail
+            f.write(_xml_file_simple.replace('</XML>', '<RootTable fourth="4" /><RootTable select="1" /></XML>'))
+            f.flush()
+            with self.assertRaises(Exception):
+                driver.refresh()
+            f.seek(0)
+            f.truncate()
+            f.write(_xml_file_simple.replace('</XML>', '<RootTable fourth="4" /></XML>'))
+            f.flush()
+            driver.refresh()
+            cursor = driver.create_cursor()
+            result = cursor.execute("SELECT _id, fourth FROM RootTable ORDER BY _id ASC").fetchall()
+            self.assertEqual(result, [(1, None), (2, None), (3, '4')])
+            cursor.close()
+            driver.close()
+
+    def test_refresh_modified_same_length(self):
+        with tempfile.NamedTemporaryFile(mode='w+', suffix='.xml') as f:
+            f.write(_xml_file_simple)
+            f.flush()
+            driver = SqliteDriver(source=f.name)
+            f.seek(0)
+            f.write(_xml_file_simple.replace('first="1"', 'first="9"'))
+            f.flush()
+            driver.refresh()
+            cursor = driver.create_cursor()
+            result = cursor.execute("SELECT first FROM RootTable WHERE _id=1").fetchall()
+            self.assertEqual(result, [('9',)])
+            cursor.close()
+            driver.close()
+
+    def test_refresh_modified_with_changes(self):
+        with tempfile.NamedTemporaryFile(mode='w+', suffix='.xml') as f:
+            f.write(_xml_file_simple)
+            f.flush()
+            driver = SqliteDriver(source=f.name)
+            cursor = driver.create_cursor()
+            cursor.execute("UPDATE RootTable SET first = 'changed' WHERE _id=1")
+            f.seek(0)
+            f.write(_xml_file_simple.replace('first="1"', 'first="9"'))
+            f.flush()
+            with self.assertRaises(UnsynchronizedChangesException):
+                driver.refresh(discard_changes=False)
+            result = cursor.execute("SELECT first FROM RootTable WHERE _id=1").fetchall()
+            self.assertEqual(result, [('changed',)])
+            cursor.close()
+            driver.close()
+
+    def test_refresh_appended_while_loading(self):
+        with tempfile.NamedTemporaryFile(mode='w+', suffix='.xml') as f:
+            f.write(_xml_file_simple)
+            f.flush()
+            def append(progress):
+                if not progress.rows_inserted:
+                    f.seek(0)
+                    f.write(_xml_file_simple.replace('</XML>', '<RootTable first="appended" /></XML>'))
+                    f.flush()
+
+            driver = SqliteDriver(source=f.name, progress=append, progress_interval=0, progress_check_every=1)
+            cursor = driver.create_cursor()
+            result = cursor.execute("SELECT first FROM RootTable ORDER BY _id ASC").fetchall()
+            self.assertEqual(result, [('1',), (None,)])
+            driver.refresh()
+            result = cursor.execute("SELECT first FROM RootTable ORDER BY _id ASC").fetchall()
+            self.assertEqual(result, [('1',), (None,), ('appended',)])
+            cursor.close()
+            driver.close()
+
+    def test_refresh_prolog(self):
+        with tempfile.NamedTemporaryFile(mode='wb', suffix='.xml') as f:
+            document = '<?xml version="1.0" encoding="ISO-8859-1"?>\n<!DOCTYPE XML [<!ENTITY e "entity">]>\n' +\
+                '<XML><RootTable first="caf\xe9" /></XML>'
+            f.write(document.encode('latin-1'))
+            f.flush()
+            driver = SqliteDriver(source=f.name)
+            f.seek(0)
+            f.write(document.replace('</XML>', '<RootTable first="na\xefve &e;" /></XML>').encode('latin-1'))
+            f.flush()
+            cursor = driver.create_cursor()
+            driver.refresh()
+            result = cursor.execute("SELECT first FROM RootTable ORDER BY _id ASC").fetchall()
+            self.assertEqual(result, [('caf\xe9',), ('na\xefve entity',)])
+            cursor.close()
+            driver.close()
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file